@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+@author: bdaniere
+
+Local caches for the repeated runs :
+- DemCache : the compressed DEM is decoded once in a memory-mapped array (.npy) on disk,
+  keyed by file path & mtime, then read without copy by the next runs / the parallel workers
+- get_transformer : process-wide cache of the pyproj transformers for the coordinate transforms
+
+Exemple :
+    dem_cache = DemCache(ch_dir + "/cache", max_size=4 * 1024 ** 3)
+    gdf = generic_function.elevation_recovery_from_dem(gdf, dem_cache)
+
+"""
+
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pyproj
+import rasterio
+import shapely
+from affine import Affine
+from rasterio.coords import BoundingBox
+
+"""
+Global variables
+"""
+# default size limit of the DEM cache on disk (bytes)
+DEM_CACHE_SIZE = 4 * 1024 ** 3
+# number of pyproj transformers kept in memory
+TRANSFORMER_CACHE_SIZE = 32
+# age (seconds) of a decoding lock file considered as left by a crashed process
+DECODE_LOCK_TIMEOUT = 3600
+
+
+"""
+Classes and functions
+"""
+
+
+class DemCache(object):
+    """
+    Class : DemCache
+    Cache of decoded DEM on disk (one .npy memory-mapped array + one .json metadata file by DEM)
+
+    An entry is invalidated when the mtime / size of the DEM file change ;
+    the least recently used entries are deleted when the cache is bigger than max_size.
+    The decoding of an entry is locked (lock file) : the workers started together decode the DEM once
+
+    :param cache_dir: cache folder (default : folder in the temporary directory)
+    :param max_size: size limit of the cache on disk (bytes)
+    """
+
+    def __init__(self, cache_dir=None, max_size=DEM_CACHE_SIZE):
+
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "dem_cache")
+        self.max_size = max_size
+        self._opened = {}
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def get(self, raster_path):
+        """
+        Return the decoded DEM (decode & store it if needed)
+
+        :param raster_path: path to the DEM
+        :rtype: CachedRaster
+        """
+
+        key = self._key(raster_path)
+        if key in self._opened:
+            return self._opened[key]
+
+        array_path, metadata_path = self._entry_path(key)
+        if not (os.path.exists(array_path) and os.path.exists(metadata_path)):
+            with self._decode_lock(key):
+                # the entry may have been decoded by another process while waiting for the lock
+                if not (os.path.exists(array_path) and os.path.exists(metadata_path)):
+                    self._invalidate(raster_path, keep=key)
+                    self._decode(raster_path, array_path, metadata_path)
+                    self._evict(keep=key)
+        else:
+            # the access time is used for the eviction of the least recently used entries
+            os.utime(metadata_path, None)
+
+        with open(metadata_path, "r") as metadata_file:
+            metadata = json.load(metadata_file)
+
+        cached_raster = CachedRaster(np.load(array_path, mmap_mode='r'), metadata)
+        self._opened[key] = cached_raster
+        return cached_raster
+
+    def clear(self):
+        """ Delete all the entries of the cache """
+
+        self._opened = {}
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.npy') or file_name.endswith('.json'):
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+    def _key(self, raster_path):
+        """ Key of a DEM : absolute path, mtime & size of the file """
+
+        raster_path = os.path.abspath(raster_path)
+        raster_stat = os.stat(raster_path)
+        key = "{}|{}|{}".format(raster_path, raster_stat.st_mtime_ns, raster_stat.st_size)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy'), os.path.join(self.cache_dir, key + '.json')
+
+    @contextlib.contextmanager
+    def _decode_lock(self, key):
+        """ Lock file of an entry (created with O_EXCL) - wait while another process decodes the same DEM """
+
+        lock_path = os.path.join(self.cache_dir, key + '.lock')
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > DECODE_LOCK_TIMEOUT:
+                        logging.warning("remove old DEM cache lock : " + lock_path)
+                        os.remove(lock_path)
+                except OSError:
+                    pass
+                time.sleep(0.1)
+
+        try:
+            yield
+        finally:
+            os.remove(lock_path)
+
+    def _decode(self, raster_path, array_path, metadata_path):
+        """ Decode the DEM block by block (internal tiles / strips of the file) in a memory-mapped array
+        written in a temporary file then renamed : only one block is in memory at a time """
+
+        logging.info("decode DEM in cache : " + raster_path)
+        with rasterio.open(raster_path) as raster:
+            temporary_array_path = array_path + '.' + str(os.getpid()) + '.tmp.npy'
+            array = np.lib.format.open_memmap(temporary_array_path, mode='w+', dtype=raster.dtypes[0],
+                                              shape=(raster.count, raster.height, raster.width))
+            for _, window in raster.block_windows(1):
+                array[:, window.row_off:window.row_off + window.height,
+                      window.col_off:window.col_off + window.width] = raster.read(window=window)
+            array.flush()
+            del array
+
+            metadata = {'source': os.path.abspath(raster_path),
+                        'transform': list(raster.transform)[:6],
+                        'nodata': raster.nodata,
+                        'crs': raster.crs.to_wkt() if raster.crs is not None else None}
+
+        temporary_metadata_path = metadata_path + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_metadata_path, "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+
+        os.replace(temporary_array_path, array_path)
+        os.replace(temporary_metadata_path, metadata_path)
+
+    def _invalidate(self, raster_path, keep):
+        """ Delete the old entries of a DEM (the file was modified) - the current entry (keep) is not deleted """
+
+        raster_path = os.path.abspath(raster_path)
+        for key, metadata in self._entries():
+            if metadata.get('source') == raster_path and key != keep:
+                logging.info("invalidate DEM cache entry : " + raster_path)
+                self._remove(key)
+
+    def _evict(self, keep):
+        """ Delete the least recently used entries while the cache is bigger than max_size """
+
+        entries = []
+        for key, _ in self._entries():
+            array_path, metadata_path = self._entry_path(key)
+            if os.path.exists(array_path):
+                entries.append((os.path.getmtime(metadata_path), key, os.path.getsize(array_path)))
+
+        cache_size = sum(entry[2] for entry in entries)
+        for _, key, size in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            logging.info("evict DEM cache entry : " + key)
+            self._remove(key)
+            cache_size -= size
+
+    def _entries(self):
+        """ List of (key, metadata) of the cache folder """
+
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, file_name), "r") as metadata_file:
+                    entries.append((file_name[:-len('.json')], json.load(metadata_file)))
+            except (IOError, ValueError):
+                continue
+        return entries
+
+    def _remove(self, key):
+        self._opened.pop(key, None)
+        for path in self._entry_path(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __getstate__(self):
+        # the memory-mapped arrays are reopened by each process (no copy of the pixels)
+        state = self.__dict__.copy()
+        state['_opened'] = {}
+        return state
+
+
+class CachedRaster(object):
+    """
+    Class : CachedRaster
+    Read-only DEM from the DemCache - same interface as rasterio dataset for the
+    functions of raster_processing (bounds, profile['nodata'], sample)
+
+    :param array: memory-mapped array (band, row, col)
+    :param metadata: dictionary (transform, nodata, crs)
+    """
+
+    def __init__(self, array, metadata):
+
+        self.array = array
+        self.transform = Affine(*metadata['transform'])
+        self.nodata = metadata['nodata']
+        self.crs = metadata['crs']
+        self.count, self.height, self.width = array.shape
+        self.profile = {'nodata': self.nodata, 'count': self.count, 'height': self.height, 'width': self.width,
+                        'dtype': str(array.dtype), 'transform': self.transform, 'crs': self.crs}
+
+    @property
+    def bounds(self):
+        left, top = self.transform * (0, 0)
+        right, bottom = self.transform * (self.width, self.height)
+        return BoundingBox(min(left, right), min(bottom, top), max(left, right), max(bottom, top))
+
+    def sample(self, coordinates):
+        """
+        Generator of the pixel values (all the bands) at each coordinate
+
+        :param coordinates: list of (x, y)
+        """
+
+        fill_value = self.nodata if self.nodata is not None else 0
+        inverse_transform = ~self.transform
+        for x, y in coordinates:
+            col, row = inverse_transform * (x, y)
+            col, row = int(np.floor(col)), int(np.floor(row))
+            if 0 <= row < self.height and 0 <= col < self.width:
+                yield np.asarray(self.array[:, row, col])
+            else:
+                yield np.full(self.count, fill_value, dtype=self.array.dtype)
+
+
+@functools.lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)
+def _cached_transformer(crs_from_wkt, crs_to_wkt):
+    return pyproj.Transformer.from_crs(pyproj.CRS.from_wkt(crs_from_wkt), pyproj.CRS.from_wkt(crs_to_wkt),
+                                       always_xy=True)
+
+
+def get_transformer(crs_from, crs_to):
+    """
+    Return a reusable pyproj transformer (x, y order) - the transformers are cached by process,
+    keyed by the normalized WKT of the crs (2154, "EPSG:2154" & "epsg:2154" give the same transformer)
+
+    :param crs_from: source crs (epsg code, string, pyproj.CRS)
+    :param crs_to: target crs (epsg code, string, pyproj.CRS)
+    :rtype: pyproj.Transformer
+    """
+
+    return _cached_transformer(pyproj.CRS.from_user_input(crs_from).to_wkt(),
+                               pyproj.CRS.from_user_input(crs_to).to_wkt())
+
+
+def clear_transformer_cache():
+    """ Delete all the cached transformers """
+
+    _cached_transformer.cache_clear()
+
+
+def to_crs(gdf, crs):
+    """
+    Reproject a GeoDataFrame with a cached transformer (batch transform of all the coordinates)
+
+    :type gdf: GeoDataFrame (2D geometry - the 3D geometries are reprojected with GeoDataFrame.to_crs)
+    :param crs: output crs (epsg code, string, pyproj.CRS)
+    :return: reprojected copy of the gdf
+    """
+
+    assert gdf.crs is not None, "The GeoDataFrame has no crs"
+    crs = pyproj.CRS.from_user_input(crs)
+    if gdf.crs == crs:
+        return gdf.copy()
+    if gdf.has_z.any():
+        return gdf.to_crs(crs)
+
+    transformer = get_transformer(gdf.crs, crs)
+    geometry = shapely.transform(np.asarray(gdf.geometry.values),
+                                 lambda coordinates: np.column_stack(
+                                     transformer.transform(coordinates[:, 0], coordinates[:, 1])))
+
+    gdf = gdf.copy()
+    gdf[gdf.geometry.name] = geometry
+    return gdf.set_crs(crs, allow_override=True)
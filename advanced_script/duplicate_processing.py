@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+@author: bdaniere
+
+Out-of-core version of generic_function.isolate_duplicate_row :
+the keys (several fields and / or the geometry) of the rows already read are hashed
+and stored in a SQLite table on disk, so the duplicates between several chunks
+(ex: the department files of a national layer) are found without loading all the data
+
+Exemple :
+    with DuplicateFinder(['nature', 'id_src'], geometry=True) as duplicate_finder:
+        for path in list_department_path:
+            gdf, gdf_duplicate = duplicate_finder.isolate_duplicate_row(generic_function.read_shp(path))
+
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+"""
+Global variables
+"""
+GEOMETRY_KEY = "_geometry_wkb"
+
+
+"""
+Classes and functions
+"""
+
+
+class DuplicateFinder(object):
+    """
+    Class : DuplicateFinder
+    Isolate the duplicate rows of a stream of (Geo)DataFrame - the first row of each key is kept (keep='first'),
+    in the order of the chunks
+
+    The keys are compared with a 64 bits hash (collision probability negligible for a national layer)
+
+    :param field: name of the column(s) use for identify the duplicate
+    :type field: str or list
+    :param geometry: if True, the geometry (WKB) is part of the key
+    :param db_path: path of the SQLite file (default : temporary file deleted by close())
+    """
+
+    def __init__(self, field, geometry=False, db_path=None):
+
+        self.field = field
+        self.geometry = geometry
+        self.temporary = db_path is None
+
+        if self.temporary:
+            file_descriptor, db_path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(file_descriptor)
+        self.db_path = db_path
+
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen_key (hash INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self.connection.execute("CREATE TEMP TABLE chunk_key (hash INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self.connection.commit()
+
+    def isolate_duplicate_row(self, gdf):
+        """
+        Isolate the duplicate rows of a chunk (duplicate in the chunk or with a previous chunk)
+
+        :type gdf: GeoDataFrame
+        :return gdf: gdf without duplicate rows
+        :return gdf_duplicate_value: gdf with duplicate rows only
+        """
+
+        duplicate_mask = self.duplicate_mask(gdf)
+        return gdf.loc[~duplicate_mask.values], gdf.loc[duplicate_mask.values]
+
+    def duplicate_mask(self, gdf):
+        """
+        Compute the duplicate mask of a chunk & store the new keys
+
+        :type gdf: GeoDataFrame
+        :return: boolean Series (True for the duplicate rows)
+        """
+
+        key_hash = pd.Series(hash_key(gdf, self.field, self.geometry), index=gdf.index)
+        duplicate_mask = key_hash.duplicated(keep='first')
+        new_hash = key_hash[~duplicate_mask]
+
+        cursor = self.connection.cursor()
+        cursor.executemany("INSERT INTO chunk_key VALUES (?)", ((int(value),) for value in new_hash.values))
+        seen_hash = set(row[0] for row in cursor.execute(
+            "SELECT chunk_key.hash FROM chunk_key JOIN seen_key ON seen_key.hash = chunk_key.hash"))
+        cursor.execute("INSERT OR IGNORE INTO seen_key SELECT hash FROM chunk_key")
+        cursor.execute("DELETE FROM chunk_key")
+        self.connection.commit()
+
+        duplicate_mask = duplicate_mask | key_hash.isin(seen_hash)
+        logging.info("We found {} duplicate rows in the chunk".format(duplicate_mask.sum()))
+        return duplicate_mask
+
+    def close(self):
+        """ Close the SQLite connection (and delete the temporary file) """
+
+        self.connection.close()
+        if self.temporary and os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def isolate_duplicate_row_in_stream(list_gdf, field, geometry=False, db_path=None):
+    """
+    Generator : isolate the duplicate rows of each (Geo)DataFrame of a stream
+
+    :param list_gdf: iterable of GeoDataFrame (ex: generator of read_shp)
+    :param field: name of the column(s) use for identify the duplicate
+    :param geometry: if True, the geometry (WKB) is part of the key
+    :param db_path: path of the SQLite file (default : temporary file)
+    :return: (gdf without duplicate rows, gdf with duplicate rows only) for each chunk
+    """
+
+    with DuplicateFinder(field, geometry, db_path) as duplicate_finder:
+        for gdf in list_gdf:
+            yield duplicate_finder.isolate_duplicate_row(gdf)
+
+
+def key_frame(gdf, field, geometry=False):
+    """
+    DataFrame of the columns use for identify the duplicate
+
+    The columns are normalized so that the same value gives the same key whatever the dtype of the chunk
+    (int64 / float64 with nulls / float32 after optimize_dtypes, category / object / string) :
+    each numeric column is split in an Int64 column (integral values) and a float64 column (other values)
+
+    :type gdf: GeoDataFrame
+    :param field: name of the column(s) - may be empty if geometry is True
+    :type field: str or list
+    :param geometry: if True, the geometry (WKB) is added to the key
+    """
+
+    fields = [field] if isinstance(field, str) else list(field)
+    assert len(fields) > 0 or geometry, "The duplicate key need at least a field or the geometry"
+
+    columns = []
+    for key_field in fields:
+        columns.extend(_normalize_key_column(gdf[key_field]))
+    if geometry:
+        columns.append(gdf.geometry.apply(lambda x: x.wkb if x is not None else None))
+
+    return pd.DataFrame(dict(enumerate(columns)), index=gdf.index)
+
+
+def _normalize_key_column(series):
+    """
+    Canonical representation of a key column (independent of the dtype)
+
+    :type series: Series
+    :return: list of Series
+    """
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = pd.Series(series.to_numpy(), index=series.index)
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return [series.astype('Int64'), pd.Series(np.nan, index=series.index)]
+
+    if pd.api.types.is_float_dtype(series):
+        values = series.astype('float64')
+        integral = (values % 1 == 0) & (values.abs() < 2 ** 63)
+        return [values.where(integral).astype('Int64'), values.mask(integral)]
+
+    if pd.api.types.is_string_dtype(series):
+        return [series.astype(object)]
+
+    return [series]
+
+
+def hash_key(gdf, field, geometry=False):
+    """
+    64 bits hash of the key of each row (signed, to be stored in SQLite)
+
+    :type gdf: GeoDataFrame
+    :param field: name of the column(s)
+    :param geometry: if True, the geometry (WKB) is part of the key
+    :return: numpy array of int64
+    """
+
+    return pd.util.hash_pandas_object(key_frame(gdf, field, geometry), index=False).values.view('int64')
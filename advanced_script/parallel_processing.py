@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+@author: bdaniere
+
+Partitioned execution of the generic_function steps on several cores :
+the GeoDataFrame is sorted along a space-filling curve (Hilbert / Z-order on the centroids),
+split in partitions, the function is applied on each partition in a process pool
+and the result is reassembled in the original order
+
+Exemple :
+    gdf = map_partitions(gdf, generic_function.clean_gdf_by_geometry)
+    gdf['geometry'] = map_partitions(gdf, generic_function.convert_3d_to_2d, on_geometry=True)
+    gdf = map_partitions(df, generic_function.geocode_df, latitude_field='y', longitude_field='x', epsg=2154)
+
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+"""
+Global variables
+"""
+ORDER_COLUMN = "_partition_order"
+# resolution of the spatial key (bits per axis)
+KEY_BITS = 16
+
+
+"""
+Classes and functions
+"""
+
+
+def map_partitions(gdf, function, n_partitions=None, max_workers=None, curve='hilbert', on_geometry=False,
+                   **kwargs):
+    """
+    Apply a function on the partitions of a (Geo)DataFrame in a process pool
+
+    - GeoDataFrame : spatial partitions (the identical geometries stay in the same partition, the rows keep
+      the original order in each partition) - the function must keep the columns of its input
+    - DataFrame (ex: geocode_df) or on_geometry=True (ex: convert_3d_to_2d) : contiguous partitions
+
+    The geometries are sent to the workers as WKB
+
+    :type gdf: GeoDataFrame or DataFrame
+    :param function: function to apply (picklable) - the partition is the first argument
+    :param n_partitions: number of partitions (default : number of workers)
+    :param max_workers: size of the process pool (default : number of cores)
+    :param curve: 'hilbert' or 'zorder' - space-filling curve used for the spatial partitions
+    :param on_geometry: if True, the function is applied on the geometry column (GeoSeries)
+    :param kwargs: other arguments of the function
+    :return: GeoDataFrame / DataFrame in the original order (list of geometries if on_geometry)
+    """
+
+    max_workers = max_workers or os.cpu_count()
+    n_partitions = n_partitions or max_workers
+    logging.info("map {} on {} partitions ({} workers)".format(
+        getattr(function, '__name__', repr(function)), n_partitions, max_workers))
+
+    if len(gdf) == 0:
+        return function(gdf.geometry if on_geometry else gdf, **kwargs)
+
+    spatial = isinstance(gdf, gpd.GeoDataFrame) and not on_geometry
+    if spatial:
+        chunk_size = int(np.ceil(len(gdf) / float(n_partitions)))
+        partitions = list(split_spatial_chunks(gdf, chunk_size, ORDER_COLUMN, curve))
+    else:
+        partitions = [gdf.iloc[positions] for positions in np.array_split(np.arange(len(gdf)), n_partitions)
+                      if len(positions) > 0]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_apply_on_partition, _to_wkb(partition), function, on_geometry, kwargs)
+                   for partition in partitions]
+        results = [_from_wkb(future.result()) for future in futures]
+
+    if on_geometry:
+        return [geometry for result in results for geometry in result]
+
+    results = [result for result in results if result is not None and len(result) > 0]
+    if len(results) == 0:
+        return function(gdf.iloc[:0], **kwargs)
+
+    output = pd.concat(results)
+    if spatial and ORDER_COLUMN in output.columns:
+        output = output.sort_values(ORDER_COLUMN, kind='mergesort').drop(columns=[ORDER_COLUMN])
+    elif spatial:
+        logging.warning("the column {} was dropped by {} : the original order can't be restored".format(
+            ORDER_COLUMN, getattr(function, '__name__', repr(function))))
+    if isinstance(results[0], gpd.GeoDataFrame):
+        output = gpd.GeoDataFrame(output, geometry=results[0].geometry.name, crs=results[0].crs)
+    return output
+
+
+def _apply_on_partition(payload, function, on_geometry, kwargs):
+    """ Worker : rebuild the partition from WKB, apply the function, send back the result as WKB """
+
+    partition = _from_wkb(payload)
+    if on_geometry:
+        partition = partition.geometry
+    return _to_wkb(function(partition, **kwargs))
+
+
+def _to_wkb(data):
+    """
+    Transform geometries to WKB buffers (cheap to pickle)
+
+    :type data: GeoDataFrame, GeoSeries, list of geometry or other object (returned as is)
+    :return: tuple (kind, data, geometry column name, crs)
+    """
+
+    if isinstance(data, gpd.GeoDataFrame):
+        geometry_name = data.geometry.name
+        frame = pd.DataFrame(data).assign(**{geometry_name: data.geometry.to_wkb().values})
+        return 'GeoDataFrame', frame, geometry_name, data.crs
+    if isinstance(data, gpd.GeoSeries):
+        return 'GeoSeries', pd.Series(data.to_wkb().values, index=data.index, name=data.name), None, data.crs
+    if isinstance(data, list):
+        return 'list', [geometry.wkb if geometry is not None else None for geometry in data], None, None
+    return 'other', data, None, None
+
+
+def _from_wkb(payload):
+    """ Rebuild the object transformed by _to_wkb """
+
+    kind, data, geometry_name, crs = payload
+    if kind == 'GeoDataFrame':
+        geometry = gpd.GeoSeries.from_wkb(data[geometry_name], index=data.index, crs=crs)
+        return gpd.GeoDataFrame(data.assign(**{geometry_name: geometry}), geometry=geometry_name, crs=crs)
+    if kind == 'GeoSeries':
+        return gpd.GeoSeries.from_wkb(data, index=data.index, crs=crs).rename(data.name)
+    if kind == 'list':
+        return list(gpd.GeoSeries.from_wkb(data).values)
+    return data
+
+
+def spatial_key(gdf, curve='hilbert'):
+    """
+    Position of the centroid of each geometry on a space-filling curve - close geometries have close keys
+    The identical geometries have the same key, the null / empty geometries are at the end
+
+    :type gdf: GeoDataFrame
+    :param curve: 'hilbert' or 'zorder'
+    :return: numpy array of int
+    """
+
+    centroid = gdf.geometry.centroid
+    return point_key(centroid.x.values, centroid.y.values, curve)
+
+
+def point_key(x, y, curve='hilbert'):
+    """
+    Position of points on a space-filling curve (the extent of the points is cut in 2^KEY_BITS cells by axis)
+    The points with a nan coordinate are at the end
+
+    :param x: numpy array of x coordinates
+    :param y: numpy array of y coordinates
+    :param curve: 'hilbert' or 'zorder'
+    :return: numpy array of int
+    """
+
+    assert curve in ['hilbert', 'zorder'], "The curve parameter must be in ['hilbert', 'zorder']"
+
+    valid = ~(np.isnan(x) | np.isnan(y))
+    key = np.full(len(x), np.iinfo(np.int64).max, dtype=np.int64)
+    if valid.sum() == 0:
+        return key
+
+    max_value = (1 << KEY_BITS) - 1
+    x_cell = _quantize(x[valid], max_value)
+    y_cell = _quantize(y[valid], max_value)
+
+    if curve == 'hilbert':
+        key[valid] = _hilbert_distance(x_cell, y_cell)
+    else:
+        key[valid] = _morton_distance(x_cell, y_cell)
+    return key
+
+
+def _quantize(values, max_value):
+    """ Transform coordinates to integer cells in [0, max_value] """
+
+    min_value = values.min()
+    extent = values.max() - min_value
+    if extent == 0:
+        return np.zeros(len(values), dtype=np.int64)
+    return ((values - min_value) / extent * max_value).astype(np.int64)
+
+
+def _morton_distance(x_cell, y_cell):
+    """ Z-order : interleave the bits of the x & y cells """
+
+    distance = np.zeros(len(x_cell), dtype=np.int64)
+    for bit in range(KEY_BITS):
+        distance |= ((x_cell >> bit) & 1) << (2 * bit)
+        distance |= ((y_cell >> bit) & 1) << (2 * bit + 1)
+    return distance
+
+
+def _hilbert_distance(x_cell, y_cell):
+    """ Hilbert curve : distance of the x & y cells along the curve (vectorized xy2d) """
+
+    side = 1 << KEY_BITS
+    x_cell = x_cell.copy()
+    y_cell = y_cell.copy()
+    distance = np.zeros(len(x_cell), dtype=np.int64)
+
+    step = side >> 1
+    while step > 0:
+        rx = ((x_cell & step) > 0).astype(np.int64)
+        ry = ((y_cell & step) > 0).astype(np.int64)
+        distance += step * step * ((3 * rx) ^ ry)
+
+        # rotation of the quadrant
+        flip = (ry == 0) & (rx == 1)
+        x_cell[flip] = side - 1 - x_cell[flip]
+        y_cell[flip] = side - 1 - y_cell[flip]
+        swap = ry == 0
+        x_cell[swap], y_cell[swap] = y_cell[swap], x_cell[swap]
+
+        step >>= 1
+    return distance
+
+
+def split_spatial_chunks(gdf, chunk_size, order_column=ORDER_COLUMN, curve='hilbert'):
+    """
+    Generator of spatially coherent chunks of a GeoDataFrame
+    A chunk is never cut between two identical keys : the identical geometries stay in the same chunk
+    In each chunk, the rows keep the original order (and the original position in order_column)
+
+    :type gdf: GeoDataFrame
+    :param chunk_size: approximate number of rows per chunk
+    :param order_column: name of the column with the original position of the rows
+    :param curve: 'hilbert' or 'zorder'
+    """
+
+    for positions in spatial_chunk_positions(spatial_key(gdf, curve), chunk_size):
+        chunk = gdf.iloc[positions].copy()
+        chunk[order_column] = positions
+        yield chunk
+
+
+def spatial_chunk_positions(key, chunk_size):
+    """
+    Generator of the positions of the rows of each spatially coherent chunk (sorted positions)
+    A chunk is never cut between two identical keys
+
+    :param key: numpy array of spatial keys (spatial_key / point_key)
+    :param chunk_size: approximate number of rows per chunk
+    """
+
+    order = np.argsort(key, kind='mergesort')
+    sorted_key = key[order]
+
+    start = 0
+    while start < len(order):
+        end = min(start + chunk_size, len(order))
+        while end < len(order) and sorted_key[end] == sorted_key[end - 1]:
+            end += 1
+
+        yield np.sort(order[start:end])
+        start = end
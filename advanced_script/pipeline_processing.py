@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+@author: bdaniere
+
+Streaming execution of a chain of generic_function steps
+(read_shp -> clean_gdf_by_geometry -> elevation_recovery_from_dem -> find_nearest_neighbors -> write_output)
+on chunks, with bounded queues and a memory budget : the full dataset is never loaded
+
+Exemple :
+    pipeline = StreamingPipeline([PipelineStage(generic_function.clean_gdf_by_geometry, cpu_bound=True,
+                                                compare_rows=True),
+                                  PipelineStage(generic_function.elevation_recovery_from_dem, cpu_bound=True),
+                                  PipelineStage(generic_function.find_nearest_neighbors, table_name=table,
+                                                con=engine)],
+                                 memory_budget=2 * 1024 ** 3,
+                                 sink=functools.partial(generic_function.write_output, table_name=table_name,
+                                                        schema=schema, conn=engine, run_tests=False))
+    pipeline.run(functools.partial(generic_function.read_shp_by_chunk, path, epsg))
+
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from advanced_script import parallel_processing
+
+"""
+Global variables
+"""
+ORDER_COLUMN = "_pipeline_order"
+# number of copies of a chunk alive at the same time inside a stage (input, output, temporary copy)
+COPY_FACTOR = 3
+# number of rows used to estimate the size of a row
+SAMPLE_SIZE = 1000
+
+
+"""
+Classes and functions
+"""
+
+
+class PipelineStage(object):
+    """
+    Class : PipelineStage
+    Declare an existing function (GeoDataFrame in, GeoDataFrame out) as a stage of the StreamingPipeline
+
+    :param function: function to apply - the chunk is the first argument, must be picklable if cpu_bound
+    :param cpu_bound: if True, the stage is executed in the process pool
+    :param workers: number of chunks processed at the same time by this stage
+                    (default : size of the process pool if cpu_bound, else 1)
+    :param compare_rows: True if the function compares the rows of the chunk (ex: drop of the duplicate
+                         geometries) - the stage needs spatially coherent chunks
+    :param kwargs: other arguments of the function
+    """
+
+    def __init__(self, function, cpu_bound=False, workers=None, compare_rows=False, **kwargs):
+
+        self.function = function
+        self.cpu_bound = cpu_bound
+        self.workers = workers
+        self.compare_rows = compare_rows
+        self.kwargs = kwargs
+
+    @property
+    def name(self):
+        return getattr(self.function, '__name__', repr(self.function))
+
+
+class StreamingPipeline(object):
+    """
+    Class : StreamingPipeline
+    Stream the chunks of a source through a list of PipelineStage
+
+    The source can be :
+    - a function chunk_size -> iterable of spatially coherent GeoDataFrame indexed by the position of the rows
+      in the source (ex: functools.partial(read_shp_by_chunk, path)) : chunk_size is a function
+      (sample GeoDataFrame -> number of rows) giving the chunk size of the memory budget, the dataset is never
+      fully loaded
+    - a GeoDataFrame already in memory : cut in spatially coherent chunks (Hilbert curve) of the budget size
+    - an iterable of GeoDataFrame (ex: one GeoDataFrame by department) : the chunk size is the one of the source,
+      the chunks are not spatially coherent (the stages with compare_rows=True are rejected)
+
+    The output is identical to running the stages one after another on the full source, as long as
+    each stage keeps the columns of its input (the original order is restored with a technical column).
+    The spatially coherent chunks never separate two identical geometries
+
+    A cpu_bound stage processes as many chunks at the same time as it has workers (default : size of the
+    process pool) ; each worker holds one chunk, so more workers means smaller chunks for the same budget
+
+    :param stages: list of PipelineStage
+    :param memory_budget: memory allowed for the chunks in flight (bytes) - define chunk size
+    :param queue_size: number of chunks waiting between two stages (backpressure)
+    :param max_workers: size of the process pool used by the cpu_bound stages (default : number of cores)
+    :param sink: function called on each output chunk (ex: write_output with run_tests=False)
+    :param keep_result: if True, the output chunks are kept & reassembled in a single GeoDataFrame
+                        (the full result is then in memory)
+    """
+
+    def __init__(self, stages, memory_budget=512 * 1024 ** 2, queue_size=2, max_workers=None, sink=None,
+                 keep_result=False):
+
+        assert len(stages) > 0, "The pipeline need at least one stage"
+        assert memory_budget > 0, "The memory_budget must be positive"
+        assert queue_size > 0, "The queue_size must be positive"
+        assert sink is not None or keep_result, "The pipeline need a sink or keep_result=True"
+
+        self.stages = stages
+        self.memory_budget = memory_budget
+        self.queue_size = queue_size
+        self.max_workers = max_workers or os.cpu_count()
+        self.sink = sink
+        self.keep_result = keep_result
+        self.workers = [stage.workers or (self.max_workers if stage.cpu_bound else 1) for stage in stages]
+
+        self._errors = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._empty_chunk = None
+
+    def run(self, source):
+        """
+        Execute the pipeline on a source
+
+        :param source: function chunk_size -> iterable of GeoDataFrame, iterable of GeoDataFrame or GeoDataFrame
+        :return: GeoDataFrame in the original order if keep_result (else None)
+        """
+
+        logging.info("Run streaming pipeline : " + " -> ".join(stage.name for stage in self.stages))
+        chunks = self._chunks(source)
+        if chunks is None:
+            assert not any(stage.compare_rows for stage in self.stages), \
+                "The chunks of an iterable source are not spatially coherent : a stage comparing the rows " \
+                "needs a GeoDataFrame or a function source (ex: read_shp_by_chunk)"
+            chunks = _numbered_chunks(source)
+
+        self._errors = []
+        self._stop.clear()
+        self._empty_chunk = None
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        pool = None
+        if any(stage.cpu_bound for stage in self.stages):
+            # the worker processes are started on demand from the stage threads : a fork of this multi-threaded
+            # process (feeder thread inside GDAL) can deadlock, the workers are started by a forkserver / spawn
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context(start_method))
+
+        threads = [threading.Thread(target=self._feed, args=(chunks, queues[0], self.workers[0]))]
+        for stage_number, stage in enumerate(self.stages):
+            next_workers = self.workers[stage_number + 1] if stage_number + 1 < len(self.stages) else 1
+            remaining = [self.workers[stage_number]]
+            lock = threading.Lock()
+            for _ in range(self.workers[stage_number]):
+                threads.append(threading.Thread(target=self._work, args=(
+                    stage_number, pool, queues[stage_number], queues[stage_number + 1], next_workers, remaining,
+                    lock)))
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            result = self._collect(queues[-1])
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            if pool is not None:
+                pool.shutdown()
+
+        if self._errors:
+            raise self._errors[0]
+        if self.keep_result and result is None:
+            result = self._empty_result()
+        return result
+
+    def _chunks(self, source):
+        """ Chunks of a GeoDataFrame / function source (with the original position of the rows in ORDER_COLUMN)
+        None for an iterable source """
+
+        if isinstance(source, gpd.GeoDataFrame):
+            chunk_size = self._compute_chunk_size(source)
+            if len(source) == 0:
+                return [source.assign(**{ORDER_COLUMN: np.arange(0)})]
+            return parallel_processing.split_spatial_chunks(source, chunk_size, ORDER_COLUMN)
+
+        if callable(source):
+            return (chunk.assign(**{ORDER_COLUMN: chunk.index.values})
+                    for chunk in source(chunk_size=self._compute_chunk_size))
+
+        return None
+
+    def _compute_chunk_size(self, gdf):
+        """
+        Number of rows per chunk so that all the chunks in flight fit in the memory budget
+
+        :type gdf: GeoDataFrame (full dataset or sample)
+        """
+
+        if len(gdf) == 0:
+            return SAMPLE_SIZE
+
+        sample = gdf.iloc[:SAMPLE_SIZE]
+        attribute_size = sample.drop(columns=[sample.geometry.name]).memory_usage(deep=True).sum()
+        geometry_size = sample.geometry.apply(lambda x: len(x.wkb) if x is not None else 0).sum()
+        row_size = float(attribute_size + geometry_size) / len(sample)
+
+        chunks_in_flight = 1 + sum(self.queue_size + workers for workers in self.workers)
+        chunk_size = max(1, int(self.memory_budget / (row_size * COPY_FACTOR * chunks_in_flight)))
+        logging.info("chunk size : {} rows".format(chunk_size))
+        return chunk_size
+
+    def _feed(self, chunks, output_queue, next_workers):
+        """ Push the chunks in the first queue """
+
+        try:
+            for chunk_number, chunk in enumerate(chunks):
+                if len(chunk) == 0:
+                    self._keep_empty_chunk(0, chunk)
+                elif not self._put(output_queue, (chunk_number, chunk)):
+                    return
+        except Exception as error:
+            self._fail(error)
+            return
+
+        for _ in range(next_workers):
+            self._put(output_queue, None)
+
+    def _work(self, stage_number, pool, input_queue, output_queue, next_workers, remaining, lock):
+        """ Apply a stage on each chunk of the input queue and push the result in the output queue """
+
+        stage = self.stages[stage_number]
+        while True:
+            item = self._get(input_queue)
+            if item is None:
+                break
+
+            chunk_number, chunk = item
+            try:
+                if stage.cpu_bound:
+                    chunk = pool.submit(stage.function, chunk, **stage.kwargs).result()
+                else:
+                    chunk = stage.function(chunk, **stage.kwargs)
+            except Exception as error:
+                logging.error("stage {} failed on chunk {}".format(stage.name, chunk_number))
+                self._fail(error)
+                return
+
+            # an empty chunk is not propagated (the next stages may not accept an empty frame),
+            # it is kept to build the output columns if no row reaches the end of the pipeline
+            if len(chunk) == 0:
+                self._keep_empty_chunk(stage_number + 1, chunk)
+            elif not self._put(output_queue, (chunk_number, chunk)):
+                return
+
+        # the last worker of the stage closes the next queue
+        with lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker:
+            for _ in range(next_workers):
+                self._put(output_queue, None)
+
+    def _collect(self, input_queue):
+        """ Get the output chunks, call the sink & restore the original order if keep_result """
+
+        result = []
+        while True:
+            item = self._get(input_queue)
+            if item is None:
+                break
+
+            chunk_number, chunk = item
+            if ORDER_COLUMN not in chunk.columns:
+                logging.warning("the column {} was dropped by a stage : the original order of the chunk {} "
+                                "can't be restored".format(ORDER_COLUMN, chunk_number))
+                chunk[ORDER_COLUMN] = np.nan
+            if self.sink is not None:
+                self.sink(chunk.drop(columns=[ORDER_COLUMN]))
+            if self.keep_result:
+                result.append(chunk)
+
+        if self._errors or not self.keep_result or len(result) == 0:
+            return None
+
+        gdf = pd.concat(result)
+        del result[:]
+        gdf = gdf.sort_values(ORDER_COLUMN, kind='mergesort')
+        return gdf.drop(columns=[ORDER_COLUMN])
+
+    def _keep_empty_chunk(self, stage_number, chunk):
+        with self._lock:
+            if self._empty_chunk is None:
+                self._empty_chunk = (stage_number, chunk)
+
+    def _empty_result(self):
+        """ Empty output (no row reached the end) : the remaining stages are applied on an emptied chunk
+        to get the same columns as the sequential execution """
+
+        if self._empty_chunk is None:
+            logging.warning("the source of the pipeline is empty")
+            return None
+
+        stage_number, gdf = self._empty_chunk
+        for stage in self.stages[stage_number:]:
+            gdf = stage.function(gdf, **stage.kwargs)
+        return gdf.drop(columns=[ORDER_COLUMN], errors='ignore')
+
+    def _put(self, output_queue, item):
+        """ Put with backpressure : wait until a place is free in the queue (or the pipeline is stopped) """
+
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, input_queue):
+        """ Get the next item of the queue - None if the pipeline is stopped """
+
+        while not self._stop.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+
+def _numbered_chunks(chunks):
+    """ Generator : add the position of the rows in the source (ORDER_COLUMN) to each chunk """
+
+    offset = 0
+    for chunk in chunks:
+        yield chunk.assign(**{ORDER_COLUMN: np.arange(offset, offset + len(chunk))})
+        offset += len(chunk)
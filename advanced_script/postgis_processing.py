@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+@author: bdaniere
+
+Push-down version of the cleaning / filtering functions of generic_function :
+the operations are compiled into sql and executed directly in Postgis,
+the result is materialized into a target table (no transfer to pandas)
+
+"""
+
+import logging
+
+
+"""
+Classes and functions
+"""
+
+
+def _drop_target_table(target_table, con):
+    """ Drop the target table if it exists (the result is always rebuilt)
+
+    :param target_table: schema.table_name
+    :type con: sqlalchemy.Engine
+    """
+
+    con.execute("DROP TABLE IF EXISTS {};".format(target_table))
+
+
+def _create_spatial_index(table_name, con, geom_col='geom'):
+    """ Create a GiST index on the geometry column of a table (if not exists)
+
+    :param table_name: schema.table_name
+    :type con: sqlalchemy.Engine
+    :param geom_col: name of the geometry column
+    """
+
+    index_name = table_name.split('.')[-1] + "_" + geom_col + "_gist"
+    con.execute("CREATE INDEX IF NOT EXISTS {} ON {} USING GIST ({});".format(index_name, table_name, geom_col))
+    con.execute("ANALYZE {};".format(table_name))
+
+
+def _count_table(table_name, con):
+    """ Return the number of rows of a Postgis table """
+
+    return con.execute("SELECT count(*) FROM {}".format(table_name)).scalar()
+
+
+def clean_table_by_geometry(table_name, target_table, con, id_col='id', geom_col='geom', make_valid=False):
+    """ Clean a Postgis table : drop null / invalid / empty / duplicate geometry
+        sql version of generic_function.clean_gdf_by_geometry
+
+    For the duplicate geometries, the row with the smallest identifier is kept (same as keep='first'
+    in clean_gdf_by_geometry when the GeoDataFrame is ordered by identifier)
+
+    :param table_name: schema.table_name of the source table
+    :param target_table: schema.table_name of the output table (dropped & recreated)
+    :type con: sqlalchemy.Engine
+    :param id_col: name of the identifier column
+    :param geom_col: name of the geometry column
+    :param make_valid: if True, the invalid geometries are repaired with ST_MakeValid instead of dropped
+    :return: number of rows in the target table
+    """
+
+    logging.info("drop null & invalid & duplicate geometry in Postgis : " + table_name)
+    count_before = _count_table(table_name, con)
+
+    if make_valid:
+        geometry_rqt = "CASE WHEN ST_IsValid({0}) THEN {0} ELSE ST_MakeValid({0}) END".format(geom_col)
+        validity_rqt = "TRUE"
+    else:
+        geometry_rqt = geom_col
+        validity_rqt = "ST_IsValid({})".format(geom_col)
+
+    _drop_target_table(target_table, con)
+    rqt = "CREATE TABLE {target} AS " \
+          "SELECT DISTINCT ON (ST_AsBinary(src.{geom})) src.* " \
+          "FROM (SELECT t.*, {geometry} AS clean_geom FROM {source} AS t " \
+          "      WHERE t.{geom} IS NOT NULL AND {validity}) AS src " \
+          "WHERE NOT ST_IsEmpty(src.clean_geom) " \
+          "ORDER BY ST_AsBinary(src.{geom}), src.{id};".format(target=target_table, source=table_name,
+                                                               geom=geom_col, id=id_col,
+                                                               geometry=geometry_rqt, validity=validity_rqt)
+    con.execute(rqt)
+
+    # replace the original geometry by the cleaned geometry
+    con.execute("ALTER TABLE {} DROP COLUMN {};".format(target_table, geom_col))
+    con.execute("ALTER TABLE {} RENAME COLUMN clean_geom TO {};".format(target_table, geom_col))
+    _create_spatial_index(target_table, con, geom_col)
+
+    count_after = _count_table(target_table, con)
+    logging.info("We found and drop {} null / invalid / duplicate geometry".format(count_before - count_after))
+    return count_after
+
+
+def isolate_duplicate_row_in_table(table_name, field, target_table, duplicate_table, con, id_col='id'):
+    """ Isolate duplicated values in specified field in Postgis
+        sql version of generic_function.isolate_duplicate_row
+
+    The rank of each row in its group of duplicates is computed once (ROW_NUMBER) in a temporary table,
+    the first row (smallest id_col, null id last) goes to target_table and the other rows to duplicate_table :
+    the rows with a null or not unique id_col are kept. The order of two rows with the same value in
+    field and id_col is not determined. The statements are executed in a single transaction
+    (no output table if a statement fails)
+
+    :param table_name: schema.table_name of the source table
+    :param field: name of the column(s) use for identify the duplicate
+    :type field: str or list
+    :param target_table: schema.table_name of the output table without duplicate rows
+    :param duplicate_table: schema.table_name of the output table with duplicate rows only
+    :type con: sqlalchemy.Engine
+    :param id_col: name of the column use for order the rows (the first row is kept)
+    :return: number of unique rows, number of duplicate rows
+    """
+
+    logging.info("isolate duplicate row in Postgis : " + table_name)
+    field = field if isinstance(field, str) else ", ".join(field)
+
+    # the temporary table is only visible by the connection of the transaction & dropped at the commit
+    with con.begin() as connection:
+        _drop_target_table(target_table, connection)
+        _drop_target_table(duplicate_table, connection)
+        connection.execute("CREATE TEMP TABLE ranked_row ON COMMIT DROP AS "
+                           "SELECT t.*, ROW_NUMBER() OVER (PARTITION BY {field} ORDER BY {id}) AS duplicate_rank "
+                           "FROM {source} AS t;".format(source=table_name, field=field, id=id_col))
+        for output_table, condition in [(target_table, "= 1"), (duplicate_table, "> 1")]:
+            connection.execute("CREATE TABLE {output} AS SELECT * FROM pg_temp.ranked_row "
+                               "WHERE duplicate_rank {condition};".format(output=output_table, condition=condition))
+            connection.execute("ALTER TABLE {} DROP COLUMN duplicate_rank;".format(output_table))
+
+    return _count_table(target_table, con), _count_table(duplicate_table, con)
+
+
+def select_data_in_territory_table(table_name, territory_table, target_table, con, geom_col='geom',
+                                   territory_geom_col='geom'):
+    """ Select data in specified area with ST_Intersects and the use of GiST index
+        sql version of generic_function.select_data_in_territory
+
+    :param table_name: schema.table_name to filter
+    :param territory_table: schema.table_name use for filter
+    :param target_table: schema.table_name of the filtered output table
+    :type con: sqlalchemy.Engine
+    :param geom_col: name of the geometry column of table_name
+    :param territory_geom_col: name of the geometry column of territory_table
+    :return: number of rows in the target table
+    """
+
+    logging.info("select data in territory in Postgis : " + table_name)
+    _create_spatial_index(table_name, con, geom_col)
+    _create_spatial_index(territory_table, con, territory_geom_col)
+
+    _drop_target_table(target_table, con)
+    con.execute("CREATE TABLE {target} AS "
+                "SELECT t.* FROM {source} AS t "
+                "WHERE EXISTS (SELECT 1 FROM {territory} AS z "
+                "              WHERE ST_Intersects(t.{geom}, z.{territory_geom}));".format(
+                    target=target_table, source=table_name, territory=territory_table, geom=geom_col,
+                    territory_geom=territory_geom_col))
+    _create_spatial_index(target_table, con, geom_col)
+
+    return _count_table(target_table, con)
+
+
+def find_hole_in_polygon_building_table(table_name, target_table, con, geom_col='geom'):
+    """ Find hole polygon in Postgis table (Polygon) with ST_NumInteriorRings
+        sql version of generic_function.find_hole_in_polygon_building
+
+    :param table_name: schema.table_name of the building table
+    :param target_table: schema.table_name of the output table with hole polygon only
+    :type con: sqlalchemy.Engine
+    :param geom_col: name of the geometry column
+    :return: number of building with hole
+    """
+
+    logging.info('finding hole in building in Postgis : ' + table_name)
+    _drop_target_table(target_table, con)
+    con.execute("CREATE TABLE {target} AS "
+                "SELECT t.*, ST_Area(t.{geom}) AS area_building FROM {source} AS t "
+                "WHERE ST_NumInteriorRings(t.{geom}) > 0;".format(target=target_table, source=table_name,
+                                                                  geom=geom_col))
+
+    count_hole = _count_table(target_table, con)
+    count_building = _count_table(table_name, con)
+    simple_part = round((float(count_hole) / float(count_building) * 100), 5) if count_building else 0
+    logging.info(
+        "We found {} buildings with hole in the territory, which represents {} % of total building number".format(
+            count_hole, simple_part))
+
+    return count_hole
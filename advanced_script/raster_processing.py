@@ -33,13 +33,16 @@ class GetRasterValueOnGeometry(object):
     """
     Class : GetRasterValueOnGeometry
 
+    :param gdf_building: GeoDataFrame
+    :param dem_cache: optional cache_processing.DemCache - the DEM is read from the cache (decoded once)
     """
 
-    def __init__(self, gdf_building):
+    def __init__(self, gdf_building, dem_cache=None):
 
         self.no_data = -99999
         self.vector_data = gdf_building
         self.raster = param["Sub_data"]["MNT_Territory"]
+        self.dem_cache = dem_cache
         self.mode = 'min'
         self._get_raster_value_on_geometry()
 
@@ -50,7 +53,10 @@ class GetRasterValueOnGeometry(object):
         """
 
         # filter by raster bounds
-        raster_opened = rasterio.open(self.raster)
+        if self.dem_cache is not None:
+            raster_opened = self.dem_cache.get(self.raster)
+        else:
+            raster_opened = rasterio.open(self.raster)
         raster_bounds = raster_opened.bounds
         study_area = box(
             raster_bounds.left,
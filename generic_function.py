@@ -9,20 +9,28 @@ Created on Mun 07 October 09:00:00 2019
 import json
 import logging
 import os
-import sys
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import folium
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 from geoalchemy2 import Geometry, WKTElement
+import shapely
 import sqlalchemy
-from fiona.crs import from_epsg
-from shapely.geometry import Point, MultiPolygon, Polygon, LineString, mapping
+from pyogrio.errors import DataSourceError
+from shapely.geometry import Point, MultiPolygon, Polygon
 from sqlalchemy import create_engine
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
+from advanced_script import cache_processing
+from advanced_script import duplicate_processing
+from advanced_script import parallel_processing
 from advanced_script import raster_processing
 from unitary_tests import unitary_tests
 
@@ -31,6 +39,8 @@ from unitary_tests import unitary_tests
 logging.basicConfig(level=logging.INFO, format='%(asctime)s -- %(levelname)s -- %(message)s')
 ch_dir = os.getcwd().replace('\\', '/')
 ch_output = ch_dir + "/output/"
+json_param = open("param.json")
+param = json.load(json_param)
 
 db_name = param["prod_connexion"]["db_name"]
 username = param["prod_connexion"]["username"]
@@ -83,16 +93,25 @@ def multipolygon_to_polygon(gdf):
     return gdf_singlepoly
 
 
-def write_output(gdf, table_name, schema, conn):
+def write_output(gdf, table_name, schema, conn, run_tests=True, optimize_dtype=False):
     """ Write GeoDataFrame in PostGis Table / execute some unitary tests
 
     :type gdf: GeoDataFrame (geometry column = "geometry")
     :param table_name : name of the output Postgis table
     :param schema: name of the output Postgis schema
     :type conn: sqlalchemy.Engine
+    :param run_tests: if False, the unitary tests are not executed (ex: writing by chunk, the tests compare
+                      the gdf with the full table)
+    :param optimize_dtype: if True, the copy written to Postgis is optimized (optimize_dtypes) - the sql types
+                           are the ones of the source columns, the table can receive the next chunks
     """
 
-    export = gdf.copy()
+    sql_types = {}
+    if optimize_dtype:
+        sql_types = _sql_types_of_source(gdf)
+        export = optimize_dtypes(gdf)[0]
+    else:
+        export = gdf.copy()
     gdf["area"] = gdf.geometry.apply(lambda x: x.area)
     geometry = gdf.geometry[gdf.index.min()].geom_type.upper()
 
@@ -101,8 +120,10 @@ def write_output(gdf, table_name, schema, conn):
     export.rename(columns={'geometry': 'geom'}, inplace=True)
 
     export.to_sql(table_name, conn, schema=schema, if_exists='append', index=False,
-                  dtype={'geom': Geometry(geometry, srid=2154)})
+                  dtype=dict(sql_types, geom=Geometry(geometry, srid=2154)))
     logging.info("Writing table {}.{} Over".format(schema, table_name))
+    if not run_tests:
+        return
 
     # unitary tests
     assert unitary_tests.compare_count_gdf_vs_postgis(gdf, schema + "." + table_name,
@@ -170,43 +191,168 @@ def creation_table(ch_table, conn, schema, table_name, db_username):
 """ Function for work with shapefile """
 
 
-def read_shp(gdf_path, gdf_epsg):
+def read_shp(gdf_path, gdf_epsg=None, bbox=None, mask=None, columns=None, rows=None, fids=None,
+             fid_as_index=False):
     """
-    Read shapefile and transform to GeoDataFrame
-
-    :param gdf_path: path to shp building
-    :param gdf_epsg: epsg code of shp building
+    Read shapefile / GeoPackage and transform to GeoDataFrame
+    The filters are applied at read time (only the selected features / fields are decoded)
+    The Arrow decoding of pyogrio is used when pyarrow is installed
+
+    :param gdf_path: path to shp building (.shp or .gpkg)
+    :param gdf_epsg: epsg code of shp building - only used if the file has no crs
+    :param bbox: (xmin, ymin, xmax, ymax) or GeoDataFrame - filter the features intersecting the bbox
+    :param mask: shapely.geometry or GeoDataFrame - filter the features intersecting the mask
+    :param columns: list of the fields to read (the geometry is always read)
+    :param rows: int (n first rows) or slice - rows to read
+    :param fids: list of the feature ids to read (can't be used with bbox / mask / rows)
+    :param fid_as_index: if True, the index of the GeoDataFrame is the feature id
     :return: Building GeoDataFrame
     """
 
     logging.info("-- Read shp : " + gdf_path.split('/')[-1])
-    assert gdf_path.split('.')[-1] == 'shp', "the value of the key 'shp_building' must be a shapeflie"
+    assert gdf_path.split('.')[-1] in ['shp', 'gpkg'], "the value of the key 'shp_building' must be a shapeflie " \
+                                                        "or a GeoPackage"
+    assert bbox is None or mask is None, "bbox and mask can't be used together"
+    assert fids is None or (bbox is None and mask is None and rows is None), \
+        "fids can't be used with bbox, mask or rows"
+
+    if not os.path.exists(gdf_path):
+        raise IOError("No such file : " + gdf_path)
 
     try:
-        gdf = gpd.read_file(gdf_path)
-        gdf.crs = {"init": "epsg :" + gdf_epsg}
-        gdf.crs = {"init": "epsg : 4326"}
-    except IOError as ioe:
-        logging.warning(ioe)
-        sys.exit()
+        gdf = gpd.read_file(gdf_path, **_read_file_kwargs(bbox, mask, columns, rows, fids, fid_as_index))
+    except DataSourceError as read_error:
+        logging.error(read_error)
+        raise IOError("Unable to read {} : {}".format(gdf_path, read_error))
+
+    if gdf.crs is None and gdf_epsg is not None:
+        gdf = gdf.set_crs(epsg=int(gdf_epsg))
+    elif gdf_epsg is not None and gdf.crs.to_epsg() != int(gdf_epsg):
+        logging.warning("the crs of {} ({}) is different from epsg:{} - the crs of the file is kept".format(
+            gdf_path.split('/')[-1], gdf.crs.to_string(), gdf_epsg))
+
+    return gdf
+
+
+def read_multiple_shp(list_gdf_path, gdf_epsg=None, max_workers=None, **read_kwargs):
+    """
+    Read in parallel a list of shapefile / GeoPackage (ex: the department files of a national layer)
+    and concatenate them in a single GeoDataFrame
+
+    :param list_gdf_path: list of path to shp / gpkg
+    :param gdf_epsg: epsg code of the files - only used if a file has no crs
+    :param max_workers: number of files read at the same time
+    :param read_kwargs: filters of read_shp (bbox, mask, columns, rows) - applied to each file
+    :return: GeoDataFrame (crs of the first file, the other files are reprojected if needed)
+    """
+
+    logging.info("-- Read {} files".format(len(list_gdf_path)))
+    assert len(list_gdf_path) > 0, "list_gdf_path is empty"
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list_gdf = list(executor.map(lambda gdf_path: read_shp(gdf_path, gdf_epsg, **read_kwargs), list_gdf_path))
+
+    crs = list_gdf[0].crs
+    list_gdf = [cache_processing.to_crs(gdf, crs) if (crs is not None and gdf.crs is not None and gdf.crs != crs)
+                else gdf for gdf in list_gdf]
+
+    gdf = gpd.GeoDataFrame(pd.concat(list_gdf, ignore_index=True), crs=crs)
     return gdf
 
 
-def formatting_gdf_for_shp_export(gdf, output_path, output_name):
+def read_shp_by_chunk(gdf_path, gdf_epsg=None, chunk_size=100000, curve='hilbert', **read_kwargs):
+    """
+    Generator : read a shapefile / GeoPackage by spatially coherent chunks (source of the StreamingPipeline)
+
+    - first pass : the geometries are read by slices of chunk_size rows (without the fields), only the
+      feature id & the centroid of each row are kept and sorted along a space-filling curve
+    - second pass : each chunk (close features) is read with its feature ids
+    A chunk is never cut between two identical geometries, the rows keep the order of the file in each chunk
+    and the index of a chunk is the position of the rows in the file (same index as read_shp)
+
+    :param gdf_path: path to shp / gpkg
+    :param gdf_epsg: epsg code of the file - only used if the file has no crs
+    :param chunk_size: approximate number of rows by chunk, or function (sample GeoDataFrame -> number of rows)
+                       called on the first rows of the file
+    :param curve: 'hilbert' or 'zorder' - space-filling curve used for the chunks
+    :param read_kwargs: filters of read_shp (bbox, mask, columns)
+    :return: GeoDataFrame of each chunk (an empty GeoDataFrame if the file has no row)
+    """
+
+    assert 'rows' not in read_kwargs and 'fids' not in read_kwargs, "The rows are defined by chunk_size"
+    columns = read_kwargs.pop('columns', None)
+
+    if callable(chunk_size):
+        # sample of the first rows for the estimation of the memory used by a row
+        chunk_size = chunk_size(read_shp(gdf_path, gdf_epsg, columns=columns, rows=1000, **read_kwargs))
+    assert chunk_size > 0, "The chunk_size must be positive"
+
+    # first pass : feature id & centroid of each row
+    list_fid, list_x, list_y = [], [], []
+    start = 0
+    while True:
+        gdf = read_shp(gdf_path, columns=[], rows=slice(start, start + chunk_size), fid_as_index=True,
+                       **read_kwargs)
+        centroid = gdf.geometry.centroid
+        list_fid.append(gdf.index.values)
+        list_x.append(centroid.x.values)
+        list_y.append(centroid.y.values)
+        if len(gdf) < chunk_size:
+            break
+        start += chunk_size
+
+    fid = np.concatenate(list_fid)
+    if len(fid) == 0:
+        yield read_shp(gdf_path, gdf_epsg, columns=columns, **read_kwargs)
+        return
+
+    # second pass : read the chunks (the driver may not return the features in the order of the fids)
+    key = parallel_processing.point_key(np.concatenate(list_x), np.concatenate(list_y), curve)
+    for positions in parallel_processing.spatial_chunk_positions(key, chunk_size):
+        gdf = read_shp(gdf_path, gdf_epsg, columns=columns, fids=fid[positions], fid_as_index=True)
+        gdf = gdf.loc[fid[positions]]
+        gdf.index = positions
+        yield gdf
+
+
+def _read_file_kwargs(bbox, mask, columns, rows, fids=None, fid_as_index=False):
+    """ Build the gpd.read_file arguments for the read time filters """
+
+    read_kwargs = {'engine': 'pyogrio', 'use_arrow': pyarrow is not None, 'fid_as_index': fid_as_index}
+    if bbox is not None:
+        read_kwargs['bbox'] = tuple(bbox) if isinstance(bbox, (list, tuple)) else bbox
+    if mask is not None:
+        read_kwargs['mask'] = mask
+    if rows is not None:
+        read_kwargs['rows'] = rows
+    if columns is not None:
+        read_kwargs['columns'] = columns
+    if fids is not None:
+        read_kwargs['fids'] = fids
+
+    return read_kwargs
+
+
+def formatting_gdf_for_shp_export(gdf, output_path, output_name, optimize_dtype=False):
     """ Formatting GeoDataFrame for export & export to shp
 
      :type gdf: GeoDataFrame
      :param output_path: complete path for the shapefile export
      :param output_name: name for the shapefile export
+     :param optimize_dtype: if True, the dtypes of gdf are optimized (optimize_dtypes) in place before the export
+                            (the category columns are written as string fields)
 
      """
     logging.info('formatting & export GeoDataFrame')
+    if optimize_dtype:
+        gdf = optimize_dtypes(gdf, inplace=True)[0]
     for gdf_column in gdf.columns:
-        if type(gdf[gdf_column].max()) in [str]:
+        if gdf_column == gdf.geometry.name:
+            continue
+        # the bool columns are kept : written in Logical dbf fields
+        # the timestamps are cast to str : the dbf has no datetime field
+        if not isinstance(gdf[gdf_column].dtype, pd.CategoricalDtype) and type(gdf[gdf_column].max()) in [str]:
             gdf[gdf_column] = gdf[gdf_column].str.decode('utf-8-sig')
-        if type(gdf[gdf_column][0]) == np.bool_:
-            gdf[gdf_column] = gdf[gdf_column].astype(str)
         if type(gdf[gdf_column][0]) == pd._libs.tslib.Timestamp:
             gdf[gdf_column] = gdf[gdf_column].astype(str)
         if type(gdf[gdf_column][gdf.index.min()]) == list:
@@ -233,18 +379,21 @@ def geom_to_wkb(gdf):
 """ Filling or formatting Functions """
 
 
-def isolate_duplicate_row(gdf, field):
+def isolate_duplicate_row(gdf, field, geometry=False):
     """ Isolate duplicated values in specified field and return unique value (Geo)DataFrame & isolate (Geo)DataFrame
+        (for several files / chunks, see advanced_script.duplicate_processing.DuplicateFinder)
 
     :type gdf: GeoDataFrame
-    :param field: name of the column use for identify the duplicate
-    :type field: str or unicode
+    :param field: name of the column(s) use for identify the duplicate
+    :type field: str or unicode or list
+    :param geometry: if True, the geometry (WKB) is part of the key
     :return gdf: gdf without duplicate rows
     :return gdf_duplicate_value: gdf with duplicate rows only
     """
 
-    gdf_duplicate_value = gdf.loc[gdf[field].duplicated(keep='first') == True]
-    gdf = gdf.loc[gdf[field].duplicated(keep='first') == False]
+    duplicate_mask = duplicate_processing.key_frame(gdf, field, geometry).duplicated(keep='first')
+    gdf_duplicate_value = gdf.loc[duplicate_mask]
+    gdf = gdf.loc[~duplicate_mask]
 
     return gdf, gdf_duplicate_value
 
@@ -306,6 +455,81 @@ def drop_col(gdf, list_cols):
     return gdf
 
 
+def optimize_dtypes(gdf, categorical_ratio=0.5, inplace=False):
+    """
+    Reduce the memory used by a (Geo)DataFrame :
+    - int columns are downcast to the smallest int type
+    - float columns are downcast to float32 when no value is changed
+    - string columns with few distinct values (ex: nature, usage, commune code) are converted to category
+    - bool & datetime columns are kept in their native type
+
+    :type gdf: GeoDataFrame or DataFrame
+    :param categorical_ratio: max ratio (number of distinct values / number of values) to convert to category
+    :param inplace: if True, the columns of gdf are replaced (no copy of the frame)
+    :return gdf: optimized gdf (copy of the gdf if not inplace)
+    :return memory_report: DataFrame with the dtype & the memory (bytes) of each column before / after
+    """
+
+    logging.info("optimize dtypes")
+    geometry_name = gdf.geometry.name if isinstance(gdf, gpd.GeoDataFrame) else None
+    dtype_before = gdf.dtypes.astype(str)
+    memory_before = gdf.memory_usage(deep=True, index=False)
+    optimized_gdf = gdf if inplace else gdf.copy()
+
+    for gdf_column in gdf.columns:
+        series = optimized_gdf[gdf_column]
+        if gdf_column == geometry_name or pd.api.types.is_bool_dtype(series) \
+                or pd.api.types.is_datetime64_any_dtype(series):
+            continue
+
+        if pd.api.types.is_integer_dtype(series):
+            optimized_gdf[gdf_column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            float32_series = series.astype(np.float32)
+            if ((float32_series.astype(series.dtype) == series) | series.isna()).all():
+                optimized_gdf[gdf_column] = float32_series
+        elif (series.dtype == object or pd.api.types.is_string_dtype(series)) and series.count() > 0:
+            not_null = series.dropna()
+            if not_null.map(type).eq(str).all() and not_null.nunique() <= categorical_ratio * len(not_null):
+                optimized_gdf[gdf_column] = series.astype('category')
+
+    memory_report = pd.DataFrame({'dtype_before': dtype_before,
+                                  'dtype_after': optimized_gdf.dtypes.astype(str),
+                                  'memory_before': memory_before,
+                                  'memory_after': optimized_gdf.memory_usage(deep=True, index=False)})
+    for gdf_column, column_report in memory_report[memory_report.dtype_before != memory_report.dtype_after].iterrows():
+        logging.info("{} : {} -> {} ({} bytes -> {} bytes)".format(
+            gdf_column, column_report.dtype_before, column_report.dtype_after, column_report.memory_before,
+            column_report.memory_after))
+    logging.info("memory usage : {} bytes -> {} bytes".format(memory_report.memory_before.sum(),
+                                                             memory_report.memory_after.sum()))
+    return optimized_gdf, memory_report
+
+
+def _sql_types_of_source(gdf):
+    """
+    Sql types of the numeric columns of a (Geo)DataFrame before optimize_dtypes, for the writing of the
+    optimized frame : the table is created with the types of the source (the downcast types would be too
+    narrow for the next chunks appended to the table)
+
+    :type gdf: GeoDataFrame or DataFrame (not optimized)
+    :return: dictionary column -> sqlalchemy type (to_sql dtype parameter)
+    """
+
+    sql_types = {}
+    for gdf_column in gdf.columns:
+        series = gdf[gdf_column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            numpy_dtype = getattr(series.dtype, 'numpy_dtype', series.dtype)
+            small_int = np.iinfo(numpy_dtype).max <= np.iinfo(np.int32).max
+            sql_types[gdf_column] = sqlalchemy.Integer if small_int else sqlalchemy.BigInteger
+        elif pd.api.types.is_float_dtype(series):
+            sql_types[gdf_column] = sqlalchemy.Float(precision=53)
+    return sql_types
+
+
 """ Spatial operation """
 
 
@@ -337,12 +561,15 @@ def find_nearest_neighbors(gdf, table_name, con):
     return gdf
 
 
-def elevation_recovery_from_dem(gdf):
+def elevation_recovery_from_dem(gdf, dem_cache=None):
     """ Find elevation for building gdf
-        Warning : the raster_processing need parameters (not informed) in this function"""
+        Warning : the raster_processing need parameters (not informed) in this function
+
+    :param dem_cache: optional cache_processing.DemCache - avoid decoding the DEM at each run
+    """
 
     logging.info("recover elevation from DEM ")
-    gdf = raster_processing.GetRasterValueOnGeometry(gdf).gdf
+    gdf = raster_processing.GetRasterValueOnGeometry(gdf, dem_cache).gdf
     gdf = gdf.rename(columns={'raster_value': "elevation"})
 
     assert gdf.elevation.isna().sum() == 0, "All buildings have no elevation"
@@ -382,14 +609,17 @@ def select_data_in_territory(gdf, gdf_territory):
     """
 
     logging.info("select data in territory")
-    # Intersection with Rtree
+    # Intersection with Rtree : the entities intersecting at least one territory are kept
     spatial_index = gdf.geometry.sindex
+    matches_index = set()
     for i, bounds in enumerate(gdf_territory.bounds.iterrows()):
         possible_matches_index = list(spatial_index.intersection(bounds[1]))
         possible_matches = gdf.iloc[possible_matches_index]
         precise_matches_index = possible_matches.intersects(gdf_territory.iloc[i].geom)
-        precise_matches_index = precise_matches_index[precise_matches_index].index
-        gdf = gdf.loc[precise_matches_index]
+        matches_index.update(precise_matches_index[precise_matches_index].index)
+
+    gdf = gdf.loc[gdf.index.isin(matches_index)]
+    return gdf
 
 
 def find_hole_in_polygon_building(gdf):
@@ -443,50 +673,23 @@ def geocode_with_api(path_to_rpls_csv):
 
 
 def convert_3d_to_2d(geometry):
-    """ Tranform 3D geometry (from GeoDataFrame.Series) to 2D geometry """
-
-    new_geo = []
-    for p in geometry:
-        if p.has_z:
-            if p.geom_type == 'Polygon':
-                ac = mapping(p)["coordinates"]
-                shell = [(x, y) for x, y, z in ac[0]]
-                holes = []
-                for h in ac[1:]:
-                    hole = [(x, y) for x, y, z in h]
-                    holes.append(hole)
-                new_p = Polygon(shell=shell, holes=holes)
-                new_geo.append(new_p)
-            elif p.geom_type == 'MultiPolygon':
-                new_multi_p = []
-                for ac in p:
-                    ac = mapping(p)["coordinates"]
-                    shell = [(x, y) for x, y, z in ac[0]]
-                    holes = []
-                    for h in ac[1:]:
-                        hole = [(x, y) for x, y, z in h]
-                        holes.append(hole)
-                    new_p = Polygon(shell=shell, holes=holes)
-                    # new_p = Polygon(shell=ac[0], holes=ac[1:])
-                    new_multi_p.append(new_p)
-                new_geo.append(MultiPolygon(new_multi_p))
-            elif p.geom_type == 'LineString':
-                lines = [xy[:2] for xy in list(p.coords)]
-                new_p = LineString(lines)
-                new_geo.append(new_p)
-            elif p.geom_type == 'Point':
-                points = [xy[:2] for xy in list(p.coords)]
-                new_p = Point(points)
-                new_geo.append(new_p)
-    return new_geo
-
-
-def gdf_to_json(gdf, orient='dict', epsg_code=2154, geometry_transformation=None):
+    """ Tranform 3D geometry (from GeoDataFrame.Series) to 2D geometry - the 2D geometries are kept as is
+
+    :type geometry: GeoSeries or list of geometry
+    :return: list of 2D geometry (same length & order)
+    """
+
+    return list(shapely.force_2d(np.asarray(geometry, dtype=object)))
+
+
+def gdf_to_json(gdf, orient='dict', epsg_code=2154, geometry_transformation=None, optimize_dtype=False):
     """
     Function to transform a GeoDataFrame to json object
     :param gdf: gpd.GeoDataFrame
     :param orient: pd.Series.to_dict parameter - output dictionary form
     :param epsg_code: int -
+    :param optimize_dtype: if True, the dtypes of gdf are optimized (optimize_dtypes) in place before the
+                           transformation
     :return:
     """
 
@@ -500,6 +703,9 @@ def gdf_to_json(gdf, orient='dict', epsg_code=2154, geometry_transformation=None
     assert geometry_transformation in possible_geometry_transformation, "The orient paramater must be in " + str(
         possible_geometry_transformation)
 
+    if optimize_dtype:
+        gdf = optimize_dtypes(gdf, inplace=True)[0]
+
     # Harmonization of the name of the geometry column
     if gdf.geometry.name == 'geom':
         gdf = gdf.rename(columns={"geom": "geometry"})
@@ -526,7 +732,7 @@ def initialize_interactive_map(gdf):
     logging.info("Create & initialize interactive map")
     assert type(gdf) == gpd.geodataframe.GeoDataFrame, 'Out_Territory is not a GeoDataFrame'
 
-    max_min = gdf['geometry'].to_crs(epsg='4326').total_bounds
+    max_min = cache_processing.get_transformer(gdf.crs, 4326).transform_bounds(*gdf['geometry'].total_bounds)
     moy_y = (max_min[0] + max_min[2]) / 2
     moy_x = (max_min[1] + max_min[3]) / 2
 
@@ -551,7 +757,7 @@ def folium_add_data_with_popup(gdf, name, color, interactive_map):
     logging.info("Add data to interactive map")
     assert type(gdf) == gpd.geodataframe.GeoDataFrame, 'Out_Territory is not a GeoDataFrame'
 
-    geojson = gdf.to_crs(epsg='4326').to_json()
+    geojson = cache_processing.to_crs(gdf, 4326).to_json()
     fcolor = lambda feature: dict(fillColor=color, color='#000000', weight=1, fillOpacity=0.9)
     nom_col = []
     alias_col = []
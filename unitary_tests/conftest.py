@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+@author: bdaniere
+
+Fixtures shared by the tests
+"""
+
+import importlib
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def generic_function(tmp_path_factory):
+    """ generic_function & raster_processing read param.json in the working directory at import :
+    the tests run in a temporary folder with an empty param.json (also used by the worker processes) """
+
+    param_dir = tmp_path_factory.mktemp("param")
+    param = {"prod_connexion": {"db_name": "", "username": "", "password": "", "host": "", "port": ""},
+             "Sub_data": {"MNT_Territory": ""}}
+    with open(str(param_dir / "param.json"), "w") as param_file:
+        json.dump(param, param_file)
+
+    current_dir = os.getcwd()
+    os.chdir(str(param_dir))
+    try:
+        yield importlib.import_module("generic_function")
+    finally:
+        os.chdir(current_dir)
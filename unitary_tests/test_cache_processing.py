@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+@author: bdaniere
+
+Check the caches of advanced_script.cache_processing : DEM decoded once for parallel workers,
+invalidation of a modified DEM, transformers shared between equivalent crs
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+np = pytest.importorskip("numpy")
+rasterio = pytest.importorskip("rasterio")
+pytest.importorskip("pyproj")
+from rasterio.transform import from_origin
+
+from advanced_script import cache_processing
+
+
+def write_dem(path, data):
+    with rasterio.open(path, 'w', driver='GTiff', width=data.shape[2], height=data.shape[1], count=data.shape[0],
+                       dtype=str(data.dtype), crs='EPSG:2154', transform=from_origin(1000, 2000, 5, 5), tiled=True,
+                       blockxsize=64, blockysize=64, compress='deflate') as dem:
+        dem.write(data)
+
+
+def read_cached_dem(cache_dir, dem_path):
+    """ Worker : decoded DEM & inode of the cache entry """
+
+    dem_cache = cache_processing.DemCache(cache_dir)
+    cached_raster = dem_cache.get(dem_path)
+    array_path = dem_cache._entry_path(dem_cache._key(dem_path))[0]
+    return np.asarray(cached_raster.array).copy(), os.stat(array_path).st_ino
+
+
+@pytest.fixture()
+def dem_data():
+    return np.random.RandomState(0).rand(2, 300, 200).astype('float32')
+
+
+def test_dem_cache_decoded_once(tmp_path, dem_data):
+    dem_path = str(tmp_path / "dem.tif")
+    cache_dir = str(tmp_path / "cache")
+    write_dem(dem_path, dem_data)
+    cache_processing.DemCache(cache_dir)
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(read_cached_dem, [cache_dir] * 8, [dem_path] * 8))
+
+    for array, _ in results:
+        assert np.array_equal(array, dem_data)
+    assert len(set(inode for _, inode in results)) == 1
+    assert sorted(os.listdir(cache_dir))[0].endswith('.json')
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_dem_cache_invalidation(tmp_path, dem_data):
+    dem_path = str(tmp_path / "dem.tif")
+    dem_cache = cache_processing.DemCache(str(tmp_path / "cache"))
+    write_dem(dem_path, dem_data)
+    assert np.array_equal(np.asarray(dem_cache.get(dem_path).array), dem_data)
+
+    write_dem(dem_path, dem_data[:, :100] * 2)
+    os.utime(dem_path, (0, 0))
+    assert np.array_equal(np.asarray(dem_cache.get(dem_path).array), dem_data[:, :100] * 2)
+    assert len(os.listdir(dem_cache.cache_dir)) == 2
+
+
+def test_transformer_cache_key():
+    cache_processing.clear_transformer_cache()
+
+    transformer = cache_processing.get_transformer(2154, 4326)
+    assert cache_processing.get_transformer("EPSG:2154", "epsg:4326") is transformer
+    assert cache_processing.get_transformer("epsg:2154", 4326) is transformer
+    assert cache_processing.get_transformer(4326, 2154) is not transformer
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+@author: bdaniere
+
+Check that advanced_script.duplicate_processing finds the duplicates between chunks
+whose key columns have different dtypes (nulls, optimize_dtypes, category)
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from advanced_script import duplicate_processing
+
+
+def first_and_second_chunk():
+    """ Same keys in two chunks : int64 / float64 with null, float64 / float32, object / category """
+
+    first_chunk = pd.DataFrame({'id': np.array([1, 2, 3], dtype='int64'),
+                                'height': np.array([1.5, 2.0, 4.25], dtype='float64'),
+                                'nature': ['house', 'garage', 'house']})
+    second_chunk = pd.DataFrame({'id': np.array([3.0, np.nan, 1.0, 4.0], dtype='float64'),
+                                 'height': np.array([4.25, 1.0, 1.5, 2.0], dtype='float32'),
+                                 'nature': pd.Categorical(['house', 'house', 'house', 'garage'])})
+    return first_chunk, second_chunk
+
+
+@pytest.mark.parametrize("field", ['id', 'height', 'nature', ['id', 'height', 'nature']])
+def test_hash_key_independent_of_dtype(field):
+    first_chunk, second_chunk = first_and_second_chunk()
+    expected = pd.concat([first_chunk.astype(object), second_chunk.astype(object)], ignore_index=True)
+
+    with duplicate_processing.DuplicateFinder(field) as duplicate_finder:
+        duplicate_mask = pd.concat([duplicate_finder.duplicate_mask(first_chunk),
+                                    duplicate_finder.duplicate_mask(second_chunk)], ignore_index=True)
+
+    assert duplicate_mask.tolist() == expected.duplicated(subset=field, keep='first').tolist()
+
+
+def test_cross_chunk_duplicates():
+    first_chunk, second_chunk = first_and_second_chunk()
+
+    with duplicate_processing.DuplicateFinder(['id', 'height']) as duplicate_finder:
+        duplicate_finder.isolate_duplicate_row(first_chunk)
+        gdf, gdf_duplicate = duplicate_finder.isolate_duplicate_row(second_chunk)
+
+    assert gdf_duplicate.index.tolist() == [0, 2]
+    assert gdf.index.tolist() == [1, 3]
+
+
+def test_null_and_integral_values_are_distinct():
+    chunk = pd.DataFrame({'id': np.array([0.0, np.nan, 0.5, 0.0, np.nan], dtype='float64')})
+    key_hash = duplicate_processing.hash_key(chunk, 'id')
+
+    assert pd.Series(key_hash).duplicated().tolist() == [False, False, False, True, True]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+@author: bdaniere
+
+Check that advanced_script.parallel_processing.map_partitions gives the same result as the sequential function
+(original order restored, identical geometries in the same partition)
+"""
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+pd = pytest.importorskip("pandas")
+from geopandas.testing import assert_geodataframe_equal
+from shapely.geometry import Point, Polygon, box
+
+from advanced_script import parallel_processing
+
+ROW_NUMBER = 400
+
+
+@pytest.fixture(scope="module")
+def gdf_building():
+    """ Buildings with a reversed index, duplicate geometries far from each other in the rows,
+    an invalid and a null geometry """
+
+    geometry = [box((i * 13) % 40 * 3, i // 40 * 2, (i * 13) % 40 * 3 + 2, i // 40 * 2 + 1) for i in range(ROW_NUMBER)]
+    geometry[-1] = geometry[0]
+    geometry[-2] = geometry[150]
+    geometry[50] = Polygon([(0, 0), (10, 10), (10, 0), (0, 10)])
+    geometry[60] = None
+    return gpd.GeoDataFrame({'id': range(1, ROW_NUMBER + 1)}, geometry=geometry, crs=2154,
+                            index=range(ROW_NUMBER)[::-1])
+
+
+@pytest.mark.parametrize("curve", ['hilbert', 'zorder'])
+def test_map_partitions_clean_gdf_by_geometry(generic_function, gdf_building, curve):
+    expected = generic_function.clean_gdf_by_geometry(gdf_building.copy())
+    result = parallel_processing.map_partitions(gdf_building.copy(), generic_function.clean_gdf_by_geometry,
+                                                n_partitions=7, max_workers=2, curve=curve)
+
+    assert len(expected) == ROW_NUMBER - 4
+    assert_geodataframe_equal(result, expected)
+
+
+def test_split_spatial_chunks(gdf_building):
+    list_chunk = list(parallel_processing.split_spatial_chunks(gdf_building, 50))
+
+    assert len(list_chunk) > 1
+    for chunk in list_chunk:
+        # original order in each chunk
+        assert chunk[parallel_processing.ORDER_COLUMN].is_monotonic_increasing
+    chunk_number = {}
+    for number, chunk in enumerate(list_chunk):
+        for position in chunk[parallel_processing.ORDER_COLUMN]:
+            chunk_number[position] = number
+    assert sorted(chunk_number) == list(range(ROW_NUMBER))
+    assert chunk_number[0] == chunk_number[ROW_NUMBER - 1]
+    assert chunk_number[150] == chunk_number[ROW_NUMBER - 2]
+
+
+def test_map_partitions_geocode_df(generic_function):
+    df = pd.DataFrame({'id': range(ROW_NUMBER), 'x': [float(i % 17) for i in range(ROW_NUMBER)],
+                       'y': [float(i // 17) for i in range(ROW_NUMBER)]}, index=range(ROW_NUMBER)[::-1])
+
+    expected = generic_function.geocode_df(df.copy(), 'y', 'x', 2154)
+    result = parallel_processing.map_partitions(df.copy(), generic_function.geocode_df, n_partitions=7,
+                                                max_workers=2, latitude_field='y', longitude_field='x', epsg=2154)
+    assert_geodataframe_equal(result, expected)
+
+
+def test_map_partitions_convert_3d_to_2d(generic_function):
+    gdf = gpd.GeoDataFrame({'id': range(4)}, geometry=[Point(0, 0, 5), Point(1, 1), box(0, 0, 1, 1), None],
+                           crs=2154)
+    gdf.loc[2, 'geometry'] = Polygon([(0, 0, 1), (1, 0, 1), (1, 1, 1)])
+
+    gdf['geometry'] = parallel_processing.map_partitions(gdf, generic_function.convert_3d_to_2d, n_partitions=3,
+                                                         max_workers=2, on_geometry=True)
+    assert not gdf.has_z.any()
+    assert gdf.geometry.tolist()[:3] == [Point(0, 0), Point(1, 1), Polygon([(0, 0), (1, 0), (1, 1)])]
+    assert gdf.geometry[3] is None
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+@author: bdaniere
+
+Check that advanced_script.pipeline_processing gives the same result as running the stages one after another,
+for each kind of source (GeoDataFrame, read_shp_by_chunk, iterable of chunks)
+"""
+
+import functools
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+pytest.importorskip("pyogrio")
+from geopandas.testing import assert_geodataframe_equal
+from shapely.geometry import Polygon, box
+
+from advanced_script.pipeline_processing import PipelineStage, StreamingPipeline
+
+# small budget : a lot of chunks for a few thousands rows
+MEMORY_BUDGET = 256 * 1024
+ROW_NUMBER = 3000
+
+
+def add_area(gdf):
+    """ Row by row stage executed in the process pool """
+
+    gdf = gdf.copy()
+    gdf['area'] = gdf.geometry.area
+    return gdf
+
+
+def keep_nothing(gdf):
+    return gdf.iloc[:0]
+
+
+@pytest.fixture(scope="module")
+def gdf_building():
+    """ Buildings in file order : the first and the last building have the same geometry,
+    with an invalid and a null geometry """
+
+    geometry = [box((i * 7) % 60 * 3, i // 60 * 2, (i * 7) % 60 * 3 + 2, i // 60 * 2 + 1) for i in range(ROW_NUMBER)]
+    geometry[-1] = geometry[0]
+    geometry[100] = Polygon([(0, 0), (10, 10), (10, 0), (0, 10)])
+    geometry[200] = None
+    return gpd.GeoDataFrame({'id': range(1, ROW_NUMBER + 1), 'nature': ['house', 'garage', 'shop'] * 1000},
+                            geometry=geometry, crs=2154)
+
+
+@pytest.fixture(scope="module")
+def building_path(gdf_building, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("pipeline") / "building.shp")
+    gdf_building.to_file(path)
+    return path
+
+
+def sequential_run(generic_function, gdf):
+    return add_area(generic_function.clean_gdf_by_geometry(gdf))
+
+
+def stages(generic_function):
+    return [PipelineStage(generic_function.clean_gdf_by_geometry, compare_rows=True),
+            PipelineStage(add_area, cpu_bound=True)]
+
+
+def test_read_shp_by_chunk(generic_function, building_path):
+    gdf = generic_function.read_shp(building_path)
+    list_chunk = list(generic_function.read_shp_by_chunk(building_path, chunk_size=500))
+
+    assert len(list_chunk) > 1
+    chunk_gdf = gpd.pd.concat(list_chunk).sort_index()
+    assert_geodataframe_equal(chunk_gdf, gdf, check_index_type=False)
+    # identical geometries in the same chunk
+    assert any(0 in chunk.index and ROW_NUMBER - 1 in chunk.index for chunk in list_chunk)
+
+
+def test_pipeline_on_geodataframe(generic_function, building_path):
+    gdf = generic_function.read_shp(building_path)
+    expected = sequential_run(generic_function, gdf.copy())
+
+    result = StreamingPipeline(stages(generic_function), memory_budget=MEMORY_BUDGET, max_workers=2,
+                               keep_result=True).run(gdf)
+    assert len(result) == ROW_NUMBER - 3
+    assert_geodataframe_equal(result, expected, check_index_type=False)
+
+
+def test_pipeline_on_file(generic_function, building_path):
+    expected = sequential_run(generic_function, generic_function.read_shp(building_path))
+
+    list_chunk = []
+    result = StreamingPipeline(stages(generic_function), memory_budget=MEMORY_BUDGET, max_workers=2,
+                               sink=list_chunk.append, keep_result=True).run(
+        functools.partial(generic_function.read_shp_by_chunk, building_path))
+    assert len(list_chunk) > 1
+    # position of the row in the file (the last row is a duplicate geometry)
+    assert result['index'].max() == ROW_NUMBER - 2
+    assert_geodataframe_equal(result, expected, check_index_type=False)
+
+
+def test_pipeline_on_iterable(generic_function, gdf_building):
+    list_chunk = [gdf_building.iloc[start:start + 700] for start in range(0, ROW_NUMBER, 700)]
+    expected = add_area(gdf_building)
+
+    result = StreamingPipeline([PipelineStage(add_area, cpu_bound=True)], max_workers=2, keep_result=True).run(
+        list_chunk)
+    assert_geodataframe_equal(result, expected, check_index_type=False)
+
+    with pytest.raises(AssertionError):
+        StreamingPipeline(stages(generic_function), keep_result=True).run(list_chunk)
+
+
+def test_pipeline_empty_result(generic_function, building_path):
+    result = StreamingPipeline(stages(generic_function) + [PipelineStage(keep_nothing)],
+                               memory_budget=MEMORY_BUDGET, keep_result=True).run(
+        functools.partial(generic_function.read_shp_by_chunk, building_path))
+
+    assert len(result) == 0
+    assert list(result.columns) == ['index', 'id', 'nature', 'geometry', 'area']
@@ -4,6 +4,8 @@ Created on Wed May 13 2019
 @author: bdaniere
 """
 
+import numbers
+
 
 def check_urban_project_category(gdf_category, general_category_set):
     not_found_category = gdf_category - general_category_set
@@ -81,4 +83,38 @@ def check_null_name(building_table_name, conn):
     sql_count_null_geom = "SELECT count(*) FROM {} WHERE name IS NULL".format(building_table_name)
     null_geom = conn.execute(sql_count_null_geom).scalar()
 
-    return null_geom == 0
\ No newline at end of file
+    return null_geom == 0
+
+
+def compare_id_gdf_vs_postgis(gdf, table_name, conn, id_field='id'):
+    gdf_id = sorted((_null_to_none(value) for value in gdf[id_field]), key=repr)
+    sql_id_request = "SELECT {} FROM {}".format(id_field, table_name)
+    table_id = sorted((_null_to_none(row[0]) for row in conn.execute(sql_id_request)), key=repr)
+
+    return gdf_id == table_id
+
+
+def compare_geometry_gdf_vs_postgis(gdf, table_name, conn, id_field='id', geom_field='geom'):
+    gdf_geometry = sorted(zip([repr(_null_to_none(value)) for value in gdf[id_field]],
+                              [geometry.wkb_hex.upper() if geometry is not None else None
+                               for geometry in gdf.geometry]), key=repr)
+    sql_geometry_request = "SELECT {}, upper(encode(ST_AsBinary({}, 'NDR'), 'hex')) FROM {}".format(
+        id_field, geom_field, table_name)
+    table_geometry = sorted([(repr(_null_to_none(row[0])), row[1]) for row in conn.execute(sql_geometry_request)],
+                            key=repr)
+
+    return gdf_geometry == table_geometry
+
+
+def compare_gdf_vs_postgis_backend(gdf, table_name, conn, id_field='id', geom_field='geom'):
+    # the id comparison include the number of rows (null id included)
+    result = compare_id_gdf_vs_postgis(gdf, table_name, conn, id_field) and \
+             compare_geometry_gdf_vs_postgis(gdf, table_name, conn, id_field, geom_field)
+    return result
+
+
+def _null_to_none(value):
+    # NaN (pandas) and NULL (Postgis) are the same missing value
+    if value is None or value != value:
+        return None
+    return float(value) if isinstance(value, numbers.Number) and not isinstance(value, bool) else value